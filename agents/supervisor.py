@@ -4,85 +4,304 @@ Clinic Supervisor - Routes user requests to the right specialist agent
 
 import os
 import asyncio
+import functools
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Final
+import httpx
 from dotenv import load_dotenv
 from azure.identity import DefaultAzureCredential
-from agent_framework import HandoffBuilder, RequestInfoEvent, WorkflowEvent, WorkflowOutputEvent, WorkflowStatusEvent, FunctionCallContent, FunctionResultContent, HandoffUserInputRequest
+from agent_framework import AgentRunUpdateEvent, ChatMessage, HandoffBuilder, HandoffUserInputRequest, RequestInfoEvent, WorkflowOutputEvent, FunctionCallContent
 from agent_framework.openai import OpenAIChatClient
 
 # Import mocked tools
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from tools.rag_tools import get_clinic_info
-from tools.booking_tools import validate_emirates_id, verify_phone, check_availability, book_appointment, cancel_appointment, reschedule_appointment
+from tools.rag_tools import get_clinic_info, get_clinic_hours, get_location_info, get_services_info, get_insurance_info, search_doctors
+from tools.booking_tools import validate_emirates_id, verify_phone, check_availability, check_availability_batch, book_appointment, cancel_appointment, reschedule_appointment
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+_TOKEN_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+# DefaultAzureCredential probes several auth providers and get_token is a
+# network round-trip, while the token itself lives ~1 hour - share both
+# across supervisor instances and refresh shortly before expiry
+_token = None
+
+
+@functools.lru_cache(maxsize=1)
+def _get_credential():
+    return DefaultAzureCredential()
+
+
+def _get_token():
+    global _token
+    if _token is not None and _token.expires_on - time.time() > 60:
+        return _token.token
+    _token = _get_credential().get_token(_TOKEN_SCOPE)
+    return _token.token
+
+
+# The expensive, process-wide piece is the pooled transport below: TLS
+# handshakes and keep-alive connections are shared by every chat client
+# built on it, so constructing a client per supervisor is cheap
+#
+# TODO: MAF's default ChatMessageStore re-sends the full history each
+# turn, so prefill cost grows linearly over a 10-turn booking flow. Once
+# the deployment targets the Responses API, switch to server-side state
+# (previous_response_id + sending only the new turn) and keep the full-
+# history path as the fallback for expired ids.
+
+
+class _AzureTokenAuth(httpx.Auth):
+    """Stamps every request with a current AAD bearer token.
+
+    The SDK bakes api_key into default headers at construction, which
+    would freeze a ~1h token for as long as the client lives; overriding
+    Authorization at the transport means each request rides whatever
+    _get_token() says is valid right now.
+    """
+
+    def auth_flow(self, request):
+        request.headers["Authorization"] = f"Bearer {_get_token()}"
+        yield request
+
+
+@functools.lru_cache(maxsize=1)
+def _get_http_client():
+    """Shared pooled transport: enough keep-alive connections for three
+    agents streaming concurrently, capped so a burst can't exhaust fds."""
+    return httpx.AsyncClient(
+        auth=_AzureTokenAuth(),
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        timeout=httpx.Timeout(60.0),
+    )
+
+
+def _get_chat_client():
+    """Build a chat client on the shared transport.
+
+    Deliberately not cached: api_key is a bearer token with a ~1h
+    lifetime, so each supervisor construction re-evaluates _get_token(),
+    and the transport-level auth keeps even long-lived clients current
+    per request. Only the fallback path (no http_client forwarding)
+    relies on the construction-time token alone.
+    """
+    kwargs = dict(
+        model_id=os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini-deployment"),
+        api_key=_get_token(),
+        base_url=os.getenv("OPENAI_API_BASE")
+    )
+    try:
+        return OpenAIChatClient(http_client=_get_http_client(), **kwargs)
+    except TypeError:
+        # Older agent-framework builds don't forward http_client to
+        # the underlying AsyncOpenAI; fall back to its own transport
+        return OpenAIChatClient(**kwargs)
+
+
+# Clinic info is static, so identical info questions ("What are your
+# hours?" vs "what are the hours") don't need a fresh LLM round-trip;
+# completed info turns are cached under a normalized key
+_INFO_CACHE_SIZE = 512
+_NORM_RE = re.compile(r"[^\w\s]")
+
+
+def _normalize(message):
+    return _NORM_RE.sub("", message.lower()).strip()
+
+
+# Near-duplicate info questions ("what are your opening hours" vs "what
+# are the clinic hours") miss the exact-key cache, so a second layer
+# compares token-count vectors by cosine similarity. Bag-of-words is
+# crude next to an embedding model, but it needs no extra dependency,
+# costs microseconds, and clinic-info phrasings share most tokens.
+_SEMANTIC_TTL_SECONDS = 3600
+_SEMANTIC_THRESHOLD = 0.9
+_SEMANTIC_CACHE_SIZE = 128
+
+# Filler words would dominate short queries ("what are YOUR hours" vs
+# "what are THE hours"), so they are excluded from the vectors
+_STOPWORDS = frozenset({
+    "a", "an", "the", "is", "are", "do", "does", "can", "could", "i", "me",
+    "my", "you", "your", "we", "us", "our", "what", "whats", "which", "of",
+    "for", "to", "at", "in", "on", "and", "please", "tell", "about",
+})
+
+
+def _token_vector(normalized):
+    """Token-count vector and its L2 norm for a normalized message"""
+    vec = {}
+    for tok in normalized.split():
+        if tok not in _STOPWORDS:
+            vec[tok] = vec.get(tok, 0) + 1
+    return vec, math.sqrt(sum(c * c for c in vec.values()))
+
+
+def _cosine(vec_a, norm_a, vec_b, norm_b):
+    if not norm_a or not norm_b:
+        return 0.0
+    if len(vec_b) < len(vec_a):
+        vec_a, vec_b = vec_b, vec_a
+    dot = sum(count * vec_b.get(tok, 0) for tok, count in vec_a.items())
+    return dot / (norm_a * norm_b)
+
+
+# Most utterances resolve with keyword matching alone - no network I/O.
+# The coordinator LLM is only consulted when the patterns are ambiguous,
+# and its routing decision is expressed through handoff tool calls, which
+# the API already constrains to the tool's JSON schema - there is no
+# free-form json_output classifier to harden here. If a dedicated LLM
+# classifier is ever reintroduced, give it strict json_schema response
+# formatting rather than json_output=True + json.loads.
+_BOOKING_RE = re.compile(r"\b(book|cancel|reschedul|appointment|slot|availab)", re.I)
+_INFO_RE = re.compile(r"\b(hour|doctor|insurance|service|location|accept|address|open)", re.I)
+_GREETINGS = frozenset({"hi", "hello", "hey", "yo", "hola", "salam", "help", "start"})
+_WELCOME_MSG: Final[str] = "Hello! I'm your clinic assistant. How can I help you today?"
+
+
+def _last_assistant_text(messages):
+    """Text of the most recent assistant/agent message, or None"""
+    for message in reversed(messages):
+        if isinstance(message, ChatMessage) and message.text and message.role.value in ("assistant", "agent"):
+            return message.text
+    return None
+
+
+def _fast_classify(message, normalized):
+    """Classify 'greeting'/'info'/'booking' deterministically, or None if
+    the message is ambiguous and needs the coordinator LLM. The caller
+    passes the already-normalized text so it isn't recomputed here."""
+    if normalized in _GREETINGS:
+        return "greeting"
+    booking = _BOOKING_RE.search(message) is not None
+    info = _INFO_RE.search(message) is not None
+    if booking and info:
+        return "mixed"
+    if booking:
+        return "booking"
+    if info:
+        return "info"
+    return None
+
+
+# Instructions are static; building them once at import keeps agent
+# construction allocation-free and the prompt prefix byte-identical
+_COORDINATOR_INSTRUCTIONS: Final[str] = (
+    "You are frontline clinic support triage. Read the user's request and decide whether "
+    "to hand off to rag_agent or booking_agent. Provide a brief natural-language response for the user.\n\n"
+    "When delegation is required, call the matching handoff tool:\n"
+    "- handoff_to_rag_agent for information queries (hours, doctors, insurance, services, location)\n"
+    "- handoff_to_booking_agent for appointment actions (check, book, cancel, reschedule)\n\n"
+    "For simple greetings, respond directly with a warm welcome."
+)
+
+_RAG_INSTRUCTIONS: Final[str] = (
+    "You handle information queries about the clinic. "
+    "ALWAYS call a tool first to retrieve accurate clinic information. "
+    "Never answer from memory - you must use a tool. "
+    "Prefer the specific tool for the question (hours, doctors, insurance, services, location); "
+    "use get_clinic_info only for broad or mixed questions. "
+    "After getting the info from the tool, provide a friendly answer to the user."
+)
+
+_BOOKING_INSTRUCTIONS: Final[str] = (
+    "You handle appointment bookings. ALWAYS use the available tools - never answer without calling tools.\n\n"
+    "For NEW bookings, follow this exact sequence:\n"
+    "1. Call validate_emirates_id - Ask for last 5 digits of Emirates ID\n"
+    "2. Call verify_phone - Ask for UAE phone number (format: +971XXXXXXXXX)\n"
+    "3. Call check_availability - Ask for preferred date (format: YYYY-MM-DD)\n"
+    "   (for several dates or doctors at once, call check_availability_batch instead of looping)\n"
+    "4. Show available slots and ask user to choose\n"
+    "5. Call book_appointment with: date, time, doctor, patient_name, reason\n"
+    "6. Return confirmation code to user\n\n"
+    "For cancellations: Call cancel_appointment with confirmation code\n"
+    "For reschedules: Call reschedule_appointment with confirmation code, new date, new time\n\n"
+    "You MUST call tools in sequence - do not skip steps or proceed without tool results."
+)
+
+
+class _UserTurnLimit:
+    """Termination condition that counts user turns incrementally.
+
+    Within one conversation the list only ever grows, so instead of
+    rescanning it on every event the callable remembers how far it has
+    counted and only inspects messages appended since the last check. A
+    conversation shorter than the cursor means the workflow started over
+    (supervisors are pooled and recycled across sessions), so the count
+    resets rather than carrying turns from the previous conversation.
+    """
+
+    __slots__ = ("_limit", "_count", "_seen")
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._count = 0
+        self._seen = 0
+
+    def __call__(self, conversation) -> bool:
+        if len(conversation) < self._seen:
+            self._count = 0
+            self._seen = 0
+        for msg in conversation[self._seen:]:
+            if msg.role.value == "user":
+                self._count += 1
+        self._seen = len(conversation)
+        return self._count >= self._limit
+
 
 class SupervisorWorkflow:
-    
+
+    __slots__ = (
+        "pending_requests", "coordinator", "rag_agent", "booking_agent",
+        "workflow", "_info_cache", "_semantic_cache",
+    )
+
     def __init__(self):
-        print("🔧 Initializing Supervisor Workflow...")
-        
+        logger.info("🔧 Initializing Supervisor Workflow...")
+
         # Track pending requests for multi-turn conversations
         # Note: This is workflow-level state tracking, separate from agent memory
         self.pending_requests = []
+
+        # LRU of normalized info question -> final response text
+        self._info_cache = OrderedDict()
+
+        # Fuzzy layer: (token vector, norm, response, timestamp) entries
+        # probed by cosine similarity when the exact key misses
+        self._semantic_cache = []
         
-        # Connect to Azure OpenAI
-        credential = DefaultAzureCredential()
-        token = credential.get_token("https://cognitiveservices.azure.com/.default")
-        
-        chat_client = OpenAIChatClient(
-            model_id=os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini-deployment"),
-            api_key=token.token,
-            base_url=os.getenv("OPENAI_API_BASE")
-        )
+        # Connect to Azure OpenAI (client shared across instances)
+        chat_client = _get_chat_client()
         
         # Create the coordinator that triages requests
         # Memory: Uses MAF's default in-memory ChatMessageStore for conversation history
         # See: https://learn.microsoft.com/en-us/agent-framework/user-guide/agents/agent-memory
         self.coordinator = chat_client.create_agent(
-            instructions=(
-                "You are frontline clinic support triage. Read the user's request and decide whether "
-                "to hand off to rag_agent or booking_agent. Provide a brief natural-language response for the user.\n\n"
-                "When delegation is required, call the matching handoff tool:\n"
-                "- handoff_to_rag_agent for information queries (hours, doctors, insurance, services, location)\n"
-                "- handoff_to_booking_agent for appointment actions (check, book, cancel, reschedule)\n\n"
-                "For simple greetings, respond directly with a warm welcome."
-            ),
+            instructions=_COORDINATOR_INSTRUCTIONS,
             name="coordinator_agent",
         )
         
         # Specialist for answering clinic info questions (with RAG tool)
         # Memory: In-memory conversation history maintained automatically by MAF
         self.rag_agent = chat_client.create_agent(
-            instructions=(
-                "You handle information queries about the clinic. "
-                "ALWAYS call get_clinic_info tool first to retrieve accurate clinic information. "
-                "Never answer from memory - you must use the tool. "
-                "After getting the info from the tool, provide a friendly answer to the user."
-            ),
+            instructions=_RAG_INSTRUCTIONS,
             name="rag_agent",
-            tools=[get_clinic_info]
+            tools=[get_clinic_info, get_clinic_hours, get_location_info, get_services_info, get_insurance_info, search_doctors]
         )
         
         # Specialist for booking appointments (with booking tools)
         self.booking_agent = chat_client.create_agent(
-            instructions=(
-                "You handle appointment bookings. ALWAYS use the available tools - never answer without calling tools.\n\n"
-                "For NEW bookings, follow this exact sequence:\n"
-                "1. Call validate_emirates_id - Ask for last 5 digits of Emirates ID\n"
-                "2. Call verify_phone - Ask for UAE phone number (format: +971XXXXXXXXX)\n"
-                "3. Call check_availability - Ask for preferred date (format: YYYY-MM-DD)\n"
-                "4. Show available slots and ask user to choose\n"
-                "5. Call book_appointment with: date, time, doctor, patient_name, reason\n"
-                "6. Return confirmation code to user\n\n"
-                "For cancellations: Call cancel_appointment with confirmation code\n"
-                "For reschedules: Call reschedule_appointment with confirmation code, new date, new time\n\n"
-                "You MUST call tools in sequence - do not skip steps or proceed without tool results."
-            ),
+            instructions=_BOOKING_INSTRUCTIONS,
             name="booking_agent",
-            tools=[validate_emirates_id, verify_phone, check_availability, book_appointment, cancel_appointment, reschedule_appointment]
+            tools=[validate_emirates_id, verify_phone, check_availability, check_availability_batch, book_appointment, cancel_appointment, reschedule_appointment]
         )
         
         # Build the workflow: coordinator routes to specialists
@@ -94,91 +313,174 @@ class SupervisorWorkflow:
             .set_coordinator(self.coordinator)
             .add_handoff(self.coordinator, [self.rag_agent, self.booking_agent])
             .with_termination_condition(
-                # Allow longer conversations for multi-step booking flows
-                # Terminate after 10 user messages OR if specialist says "confirmed"/"completed"
-                lambda conv: sum(1 for msg in conv if msg.role.value == "user") >= 10
+                # Allow longer conversations for multi-step booking flows:
+                # terminate after 10 user messages (counted incrementally)
+                _UserTurnLimit(10)
             )
             .build()
         )
         
-        print("✅ Supervisor ready with coordinator + 2 specialists\n")
+        logger.info("✅ Supervisor ready with coordinator + 2 specialists")
     
     async def route(self, user_message: str) -> str:
-        """Send user message through workflow and return the response"""
-        print(f"\n💬 User: {user_message}")
-        
+        """Send user message through workflow and return the full response"""
+        return "".join([chunk async for chunk in self.route_stream(user_message)])
+
+    async def route_stream(self, user_message: str):
+        """Stream the response as workflow events arrive.
+
+        Yields text chunks as they are produced instead of buffering the
+        whole event list, so the UI shows the first token as soon as the
+        model emits it and memory stays O(1) in conversation length.
+        """
+        logger.info("💬 User: %s", user_message)
+
+        # Repeated info questions answer straight from cache - no LLM call.
+        # Only safe when no booking conversation is in flight.
+        rag_task = None
+        cache_key = _normalize(user_message)
+        if not self.pending_requests:
+            cached = self._info_cache.get(cache_key)
+            if cached is not None:
+                self._info_cache.move_to_end(cache_key)
+                logger.info("⚡ Cache hit")
+                yield cached
+                return
+
+            cached = self._semantic_lookup(cache_key)
+            if cached is not None:
+                logger.info("⚡ Semantic cache hit")
+                yield cached
+                return
+
+            intent = _fast_classify(user_message, cache_key)
+            if intent == "greeting":
+                logger.info("⚡ Greeting fast path")
+                yield _WELCOME_MSG
+                return
+            if intent == "info":
+                # Unambiguous info query: skip the coordinator hop and ask
+                # the RAG specialist directly (one LLM call instead of two)
+                logger.info("⚡ Info fast path → Rag Agent")
+                result = await self.rag_agent.run(user_message)
+                if result.text:
+                    self._cache_info(cache_key, result.text)
+                    yield result.text
+                else:
+                    # Empty text is a transient model hiccup; the greeting
+                    # fallback must never become the cached answer
+                    yield _WELCOME_MSG
+                return
+            if intent == "mixed":
+                # Compound query: answer the info part before the booking
+                # workflow so the combined reply keeps info-first ordering
+                logger.info("⚡ Mixed intent → RAG answer leads the reply")
+                rag_task = asyncio.create_task(self.rag_agent.run(user_message))
+
         # Check if we have pending requests (multi-turn conversation)
         if self.pending_requests:
             responses = {req.request_id: user_message for req in self.pending_requests}
             self.pending_requests = []
-            events = [event async for event in self.workflow.send_responses_streaming(responses)]
+            stream = self.workflow.send_responses_streaming(responses)
         else:
-            events = [event async for event in self.workflow.run_stream(user_message)]
-        
-        # Track routing and tools
+            stream = self.workflow.run_stream(user_message)
+
+        # The info half of a compound query goes out first
+        if rag_task is not None:
+            rag_result = await rag_task
+            if rag_result.text:
+                yield f"{rag_result.text}\n\n"
+
+        # Track routing and tools; the last assistant text seen in request
+        # and output events doubles as the fallback for tool-only turns
         handoff_target = None
         tools_used = []
-        
-        # Process events
-        for event in events:
-            event_name = type(event).__name__
-            
+        streamed_parts = []
+        request_text = None
+        output_text = None
+
+        # Process events as they arrive - dispatch on class, not type-name
+        # strings, so the hot loop is two pointer compares per event
+        async for event in stream:
             # Capture pending requests for multi-turn conversations
             if isinstance(event, RequestInfoEvent):
                 self.pending_requests.append(event)
-            
-            # Track agent handoffs and tool calls
-            elif event_name == "AgentRunUpdateEvent":
-                if hasattr(event, 'data') and hasattr(event.data, 'contents'):
-                    contents = event.data.contents
-                    
+                if isinstance(event.data, HandoffUserInputRequest) and event.data.conversation:
+                    request_text = _last_assistant_text(event.data.conversation) or request_text
+
+            # Track agent handoffs and tool calls; forward text deltas
+            elif isinstance(event, AgentRunUpdateEvent):
+                contents = getattr(event.data, 'contents', None)
+                if contents:
                     # Detect handoff calls
-                    for call in [c for c in contents if isinstance(c, FunctionCallContent)]:
-                        if call.name and call.name.startswith('handoff_to_'):
+                    for call in contents:
+                        if not isinstance(call, FunctionCallContent) or not call.name:
+                            continue
+                        if call.name.startswith('handoff_to_'):
                             handoff_target = call.name.replace('handoff_to_', '').replace('_', ' ').title()
-                        elif call.name and not call.name.startswith('('):
+                        elif not call.name.startswith('('):
                             tools_used.append(call.name)
-        
+                delta = getattr(event.data, 'text', None)
+                if delta:
+                    streamed_parts.append(delta)
+                    yield delta
+
+            elif isinstance(event, WorkflowOutputEvent):
+                if isinstance(event.data, list):
+                    output_text = _last_assistant_text(event.data) or output_text
+
         # Clean output
         if handoff_target:
-            print(f"🎯 Coordinator → {handoff_target}")
-        
+            logger.info("🎯 Coordinator → %s", handoff_target)
+
         if tools_used:
-            print(f"🔧 Tools: {', '.join(tools_used)}")
-        
-        print()
-        
-        # Extract the final response
-        return self._extract_response(events)
-    
-    def _extract_response(self, events: list[WorkflowEvent]) -> str:
-        """Get the last agent message from the workflow events"""
-        from agent_framework import ChatMessage, HandoffUserInputRequest
-        
-        # First check for RequestInfoEvent (multi-turn conversations)
-        for event in reversed(events):
-            if isinstance(event, RequestInfoEvent):
-                if isinstance(event.data, HandoffUserInputRequest):
-                    # Get the last message from the conversation
-                    if event.data.conversation:
-                        for message in reversed(event.data.conversation):
-                            if isinstance(message, ChatMessage):
-                                if message.role.value in ["assistant", "agent"] and message.text:
-                                    return message.text
-        
-        # Then check for WorkflowOutputEvent (completed workflows)
-        for event in reversed(events):
-            if isinstance(event, WorkflowOutputEvent) and isinstance(event.data, list):
-                # Get the last agent message
-                for message in reversed(event.data):
-                    if isinstance(message, ChatMessage):
-                        if message.role.value in ["assistant", "agent"] and message.text:
-                            return message.text
-        
-        # Default fallback
-        return "Hello! I'm your clinic assistant. How can I help you today?"
+            logger.info("🔧 Tools: %s", ", ".join(tools_used))
+
+        # Tool-only turns stream no text; fall back to the text captured
+        # during the pass (pending-input conversations take precedence)
+        response = "".join(streamed_parts)
+        if not response:
+            response = request_text or output_text or _WELCOME_MSG
+            yield response
 
+        # Cache completed info turns (routed to the RAG specialist and not
+        # waiting on user input); booking turns are stateful and never
+        # cached, nor is the welcome fallback for a turn that produced
+        # no text - the cache has no TTL, so a transient empty response
+        # must not become the permanent answer
+        if (
+            handoff_target
+            and "rag" in handoff_target.lower()
+            and not self.pending_requests
+            and response != _WELCOME_MSG
+        ):
+            self._cache_info(cache_key, response)
 
+    def _cache_info(self, cache_key: str, response: str) -> None:
+        """Store a completed info answer in both cache layers"""
+        self._info_cache[cache_key] = response
+        if len(self._info_cache) > _INFO_CACHE_SIZE:
+            self._info_cache.popitem(last=False)
+        vec, norm = _token_vector(cache_key)
+        self._semantic_cache.append((vec, norm, response, time.time()))
+        if len(self._semantic_cache) > _SEMANTIC_CACHE_SIZE:
+            del self._semantic_cache[0]
+
+    def _semantic_lookup(self, cache_key: str):
+        """Best near-duplicate cached answer, or None below the threshold"""
+        if not self._semantic_cache:
+            return None
+        vec, norm = _token_vector(cache_key)
+        cutoff = time.time() - _SEMANTIC_TTL_SECONDS
+        best, best_score = None, _SEMANTIC_THRESHOLD
+        for entry_vec, entry_norm, response, stamp in self._semantic_cache:
+            if stamp < cutoff:
+                continue
+            score = _cosine(vec, norm, entry_vec, entry_norm)
+            if score >= best_score:
+                best, best_score = response, score
+        return best
+    
 def create_supervisor():
     return SupervisorWorkflow()
 
@@ -200,4 +502,5 @@ async def test_supervisor():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     asyncio.run(test_supervisor())
@@ -4,60 +4,196 @@ Run with: python app.py
 """
 
 import asyncio
+import time
 import gradio as gr
 from dotenv import load_dotenv
 import threading
 
 load_dotenv()
 
-# Lazy-load supervisor to avoid slow startup
-_supervisor = None
-_event_loop = None
-_loop_thread = None
+# One setting drives both the Gradio queue admission and the pool size,
+# so every chat the queue lets run can actually get a supervisor
+MAX_CONCURRENCY = 8
 
+# How long acquire() waits for a supervisor before the chat reports busy
+ACQUIRE_TIMEOUT_SECONDS = 10.0
 
-def get_event_loop():
-    """Get or create persistent event loop running in background thread."""
-    global _event_loop, _loop_thread
-    if _event_loop is None:
-        _event_loop = asyncio.new_event_loop()
-        
-        def run_loop():
-            asyncio.set_event_loop(_event_loop)
-            _event_loop.run_forever()
-        
-        _loop_thread = threading.Thread(target=run_loop, daemon=True)
-        _loop_thread.start()
-    
-    return _event_loop
+# Sessions idle this long are assumed abandoned (unload doesn't fire on
+# browser crashes or dropped connections) and their supervisor reclaimed
+SESSION_IDLE_SECONDS = 1800.0
+
+BUSY_MSG = (
+    "⏳ All assistants are helping other patients right now - "
+    "please try again in a moment."
+)
 
 
 def get_supervisor():
-    """Get or create supervisor instance."""
-    global _supervisor
-    if _supervisor is None:
-        print("🚀 Initializing agents...")
-        from agents.supervisor import create_supervisor
-        _supervisor = create_supervisor()
-    return _supervisor
+    """Create a supervisor instance (used to fill the pool).
+
+    Construction is cheap to repeat where it counts: every instance
+    shares one chat client backed by one httpx.AsyncClient with an
+    explicit keep-alive pool (see agents.supervisor._get_http_client),
+    so TLS/TCP setup to the LLM endpoint is paid once per process, not
+    per supervisor or per message.
+    """
+    print("🚀 Initializing agents...")
+    from agents.supervisor import create_supervisor
+    return create_supervisor()
+
+
+class SupervisorPool:
+    """Fixed-size pool of supervisors checked out one per browser session.
+
+    A single shared supervisor serializes concurrent users on its workflow
+    state; a pool lets them overlap, and once all supervisors are taken
+    acquire() awaits, giving natural backpressure under load. Checkout is
+    per session, never per message: pending_requests and the handoff
+    conversation live on the supervisor, so a multi-turn booking flow must
+    see the same instance for every turn. Sized to the queue's
+    concurrency limit so admitted chats never starve, and acquire() is
+    bounded - a full pool yields a busy reply, not an endless spinner.
+    """
+
+    def __init__(self, size: int = MAX_CONCURRENCY):
+        self._size = size
+        self._created = 0
+        self._lock = threading.Lock()
+        self._idle = asyncio.Queue()
+        # Supervisors built off-loop by the warmup thread land here
+        self._prebuilt = []
+
+    async def acquire(self, timeout: float = None):
+        """Take an idle supervisor, lazily building up to `size` of them.
+
+        Returns None if nothing frees up within `timeout` seconds, so
+        callers can tell the user the pool is saturated instead of
+        spinning forever.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._prebuilt:
+                    return self._prebuilt.pop()
+            try:
+                return self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            grow = False
+            with self._lock:
+                if self._created < self._size:
+                    self._created += 1
+                    grow = True
+            if grow:
+                # Construction does network I/O (token fetch); keep it off
+                # the server loop
+                return await asyncio.to_thread(get_supervisor)
+            # Poll instead of parking on the queue: warm() reserves every
+            # slot up front and lands instances in _prebuilt from a plain
+            # thread, which a blocked Queue.get() would never observe - a
+            # message arriving mid-warmup would hang until some other
+            # message cycled a supervisor through release()
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(0.05)
+
+    def release(self, supervisor):
+        self._idle.put_nowait(supervisor)
+
+    def warm(self, count: int = None):
+        """Pre-build supervisors so early messages skip startup cost;
+        with no count, fill the whole pool."""
+        with self._lock:
+            remaining = self._size - self._created
+            count = remaining if count is None else min(count, remaining)
+            self._created += count
+        for _ in range(count):
+            supervisor = get_supervisor()
+            with self._lock:
+                self._prebuilt.append(supervisor)
+
+
+POOL = SupervisorPool()
 
+# session_hash -> (supervisor, last-activity timestamp) pinned for the
+# lifetime of that browser session, so every turn of a multi-turn flow
+# hits the same workflow state; the timestamp drives idle eviction
+_SESSIONS = {}
+_sessions_lock = threading.Lock()
 
-async def chat(message: str, history: list) -> str:
-    """Handle chat messages through supervisor."""
-    supervisor = get_supervisor()
-    response = await supervisor.route(message)
-    return response
 
+def _evict_idle_sessions(now: float):
+    """Reclaim supervisors from sessions idle past SESSION_IDLE_SECONDS.
 
-def chat_wrapper(message: str, history: list) -> str:
-    """Wrapper to run async chat function in persistent event loop."""
-    loop = get_event_loop()
-    future = asyncio.run_coroutine_threadsafe(chat(message, history), loop)
-    return future.result()
+    unload never fires for crashed browsers or dropped connections, and
+    each leaked entry would shrink the pool permanently; sweeping on
+    every checkout keeps the cap honest without a background task.
+    """
+    with _sessions_lock:
+        stale = [
+            key for key, (_, last_used) in _SESSIONS.items()
+            if now - last_used > SESSION_IDLE_SECONDS
+        ]
+        reclaimed = [_SESSIONS.pop(key)[0] for key in stale]
+    for supervisor in reclaimed:
+        POOL.release(supervisor)
+
+
+async def _session_supervisor(request: gr.Request):
+    """Supervisor pinned to this session, acquiring one on first use.
+
+    Returns None when the pool stays saturated past the acquire timeout.
+    """
+    key = request.session_hash if request is not None else "default"
+    now = time.monotonic()
+    _evict_idle_sessions(now)
+    with _sessions_lock:
+        entry = _SESSIONS.get(key)
+        if entry is not None:
+            _SESSIONS[key] = (entry[0], now)
+            return entry[0]
+    supervisor = await POOL.acquire(timeout=ACQUIRE_TIMEOUT_SECONDS)
+    if supervisor is None:
+        return None
+    with _sessions_lock:
+        # Two first-turn messages from one session can race; keep the
+        # winner and hand the loser's instance back to the pool
+        existing, _ = _SESSIONS.setdefault(key, (supervisor, now))
+    if existing is not supervisor:
+        POOL.release(supervisor)
+        supervisor = existing
+    return supervisor
+
+
+async def _release_session(request: gr.Request):
+    """Return the session's supervisor to the pool when the tab closes."""
+    with _sessions_lock:
+        entry = _SESSIONS.pop(request.session_hash, None)
+    if entry is not None:
+        POOL.release(entry[0])
+
+
+async def chat_fn(message: str, history: list, request: gr.Request):
+    """Route a message on this session's supervisor, streaming partial text.
+
+    Async on purpose: Gradio runs coroutine handlers on its own server
+    loop, so there is no worker-thread hop or cross-thread future wait,
+    and many chats can be in flight concurrently on one loop. Yielding
+    the accumulated reply per chunk renders tokens as the model decodes
+    them instead of after the full response.
+    """
+    supervisor = await _session_supervisor(request)
+    if supervisor is None:
+        yield BUSY_MSG
+        return
+    partial = ""
+    async for chunk in supervisor.route_stream(message):
+        partial += chunk
+        yield partial
 
 
 demo = gr.ChatInterface(
-    fn=chat_wrapper,
+    fn=chat_fn,
     title="🏥 Abu Dhabi Clinic - AI Assistant",
     description=(
         "**Ask me about:**\n\n"
@@ -76,5 +212,22 @@ demo = gr.ChatInterface(
     ]
 )
 
+with demo:
+    demo.unload(_release_session)
+
+
+def _warmup():
+    """Build every pooled supervisor (credential probe + token fetch +
+    agents) while Gradio binds, so no user-facing message ever pays init
+    cost. The credential, token and chat client are shared singletons,
+    so only the first build is expensive."""
+    POOL.warm()
+
+
 if __name__ == "__main__":
+    threading.Thread(target=_warmup, daemon=True).start()
+    # route() spends nearly all its time awaiting the LLM, so let several
+    # chats overlap on the loop; max_size bounds the waiting line instead
+    # of letting requests pile up unboundedly under load
+    demo.queue(default_concurrency_limit=MAX_CONCURRENCY, max_size=64)
     demo.launch(server_name="0.0.0.0", server_port=7860)
@@ -4,11 +4,14 @@ Shows how the 3-step process enforces order
 """
 
 import asyncio
-from agents.booking_agent_sequential import create_sequential_booking_workflow
-from agent_framework import WorkflowOutputEvent, Role
 from typing import cast
 
 async def main():
+    # Imported here so collecting this file (pytest --collect-only) does
+    # not pay the full agent-framework import cost
+    from agents.booking_agent_sequential import create_sequential_booking_workflow
+    from agent_framework import WorkflowOutputEvent, Role
+
     print("=" * 70)
     print("TESTING SEQUENTIAL ORCHESTRATION PATTERN")
     print("=" * 70)
@@ -28,17 +31,17 @@ async def main():
     print("SEQUENTIAL WORKFLOW EXECUTION:\n")
     
     step_count = 0
+    last_idx = 0  # conversation only grows; scan just the new tail
     async for event in workflow.run_stream(prompt):
         if isinstance(event, WorkflowOutputEvent):
             conversation = cast(list, event.data)
-            # Find latest assistant message
-            for msg in reversed(conversation):
+            for msg in conversation[last_idx:]:
                 if msg.role == Role.ASSISTANT and msg.author_name:
                     step_count += 1
                     print(f"STEP {step_count} - {msg.author_name}:")
                     print(f"{msg.text[:200]}...")
                     print()
-                    break
+            last_idx = len(conversation)
     
     print("=" * 70)
     print("✓ WORKFLOW COMPLETE")
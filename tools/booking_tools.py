@@ -1,42 +1,426 @@
 """
 Booking Tools - Mocked appointment management
 TODO: Replace with real Booking API MCP Server and Emirates ID Verification MCP Server
+
+Persistence design: the booking table lives in an in-process dict loaded
+once at import; tool calls mutate it directly (slot claims go through an
+atomic setdefault, so no lock sits on the hot path). Durability is
+write-behind - each mutation is appended to a WAL by a dedicated writer
+thread, and a debounced timer compacts the log into a fresh snapshot off
+the request path. Set BOOKING_BACKEND=sqlite to swap the WAL+snapshot
+pair for an engine-backed table.
 """
 
+import atexit
 import json
+import mmap
+import os
+import queue
+import re
+import secrets
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Annotated
-from uuid import uuid4
 from pydantic import Field
 
 
 BOOKING_STORE = Path(__file__).parent / "bookings.json"
+BOOKING_WAL = BOOKING_STORE.with_suffix(".wal.jsonl")
+BOOKING_DB = BOOKING_STORE.with_suffix(".db")
+FLUSH_DELAY_SECONDS = 0.5
+
+# Set BOOKING_BACKEND=sqlite for durable engine-backed persistence
+# (B-tree writes + UNIQUE slot constraint) instead of the JSON snapshot
+_USE_SQLITE = os.getenv("BOOKING_BACKEND", "json").lower() == "sqlite"
+
+# orjson decodes/encodes several times faster than stdlib json; fall back
+# silently since it's an optional dependency. Output is compact in both
+# cases - nothing human reads the store often enough to justify paying
+# for indentation bytes on every flush.
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# Each (doctor, date) pair gets one int bitmask; one bit per time slot.
+# Availability is a single AND, booking a single bit-set - no per-slot
+# string keys or dict lookups on the hot path.
+DEFAULT_TIME_SLOTS = ("09:00", "14:00", "16:30")
+SLOT_BITS = {time: 1 << i for i, time in enumerate(DEFAULT_TIME_SLOTS)}
+SLOT_TIMES = {bit: time for time, bit in SLOT_BITS.items()}
+ALL_MASK = (1 << len(DEFAULT_TIME_SLOTS)) - 1
+
+
+# One DFA pass handles every slot spelling users echo back from the
+# availability list: "09:00", "0900", "slot 0900", "2026-01-05 09:00"
+_SLOT_RE = re.compile(r"^(?:(?P<date>\d{4}-\d{2}-\d{2})[ :|_-]+)?(?:slot[ :|_-]*)?(?P<h>\d{2}):?(?P<m>\d{2})$")
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}$")
+
+
+@lru_cache(maxsize=1024)
+def _parse_slot_id(slot_id):
+    """Parse a slot reference into (date or None, 'HH:MM'), or (None, None)"""
+    m = _SLOT_RE.match(slot_id.strip().lower())
+    if not m:
+        return None, None
+    return m["date"], f"{m['h']}:{m['m']}"
+
+
+@lru_cache(maxsize=4096)
+def _format_slot_id(time_str):
+    """Slot id shown next to a time: '09:00' -> '09:00 (slot 0900)'"""
+    return f"{time_str} (slot {time_str.replace(':', '')})"
+
+
+# Slot labels never change at runtime, so render them once at import
+_SLOT_LABELS = {bit: _format_slot_id(time) for bit, time in SLOT_TIMES.items()}
+
+
+@lru_cache(maxsize=256)
+def _normalize_doctor(doctor):
+    """Canonical key for a doctor name: 'Dr. Sarah Williams' -> 'sarah-williams'"""
+    words = doctor.lower().replace(".", " ").split()
+    if words and words[0] == "dr":
+        words = words[1:]
+    return "-".join(words)
+
+
+@lru_cache(maxsize=256)
+def _doctor_label(doctor):
+    """Display form for a doctor name or key: 'sarah-williams' -> 'Dr. Sarah Williams'"""
+    words = doctor.replace(".", " ").replace("-", " ").split()
+    if words and words[0].lower() == "dr":
+        words = words[1:]
+    if not words:
+        return doctor
+    return "Dr. " + " ".join(w.capitalize() for w in words)
+
+
+@lru_cache(maxsize=4096)
+def _slot_key(doctor_key, date):
+    return f"{doctor_key}|{date}"
+
+
+@dataclass(slots=True)
+class Booking:
+    """In-memory booking row. Slotted, so each record carries five string
+    pointers instead of a per-instance dict; the on-disk JSON shape is
+    unchanged because asdict() runs at the WAL/snapshot boundary."""
+    date: str
+    time: str
+    doctor: str
+    patient: str
+    reason: str
+
+
+def _make_confirmation():
+    """Single source for confirmation codes, e.g. 'APT-1A2B3C4D'"""
+    return f"APT-{secrets.token_hex(4).upper()}"
+
+
+def _release_slot(booking):
+    """Release a booking's slot claim and clear its bit in the mask cache."""
+    key = _slot_key(_normalize_doctor(booking.doctor), booking.date)
+    _STORE["slots"].pop(f"{key}|{booking.time}", None)
+    mask = _STORE["masks"].get(key, 0) & ~SLOT_BITS.get(booking.time, 0)
+    if mask:
+        _STORE["masks"][key] = mask
+    else:
+        _STORE["masks"].pop(key, None)
 
 
 def _load_bookings():
-    if BOOKING_STORE.exists():
-        return json.loads(BOOKING_STORE.read_text())
-    return {"bookings": {}, "slots": {}}
+    if not BOOKING_STORE.exists() or BOOKING_STORE.stat().st_size == 0:
+        return {"bookings": {}}
+    # Parse straight from the mapped pages - no full-file copy into a
+    # Python string first, and the OS page cache manages residency
+    with open(BOOKING_STORE, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        try:
+            return _loads(memoryview(mm))
+        except TypeError:
+            # stdlib json can't read a buffer; orjson can
+            return _loads(mm[:])
+
+
+# WAL appends happen on a dedicated writer thread so the fsync never
+# blocks the agent runtime's event loop (the tools run inside an async
+# agent); callers just enqueue and return.
+_WAL_QUEUE = queue.Queue()
+
+# The append fd stays open between records - no per-append path lookup
+# and file-table churn. The lock only contends at compaction, when the
+# fd must be closed before the log file is unlinked.
+_wal_fd = None
+_wal_fd_lock = threading.Lock()
+
+
+# Sentinel enqueued at COMPACT_EVERY so the snapshot rewrite runs on the
+# writer thread instead of blocking whichever tool call hit the threshold
+_COMPACT = object()
+
+
+def _wal_writer():
+    global _wal_fd
+    while True:
+        # Block for the first record, then drain whatever else queued up
+        # while we slept: a burst of mutations becomes one os.write and -
+        # crucially - one fsync, instead of a disk barrier per record
+        records = [_WAL_QUEUE.get()]
+        try:
+            while True:
+                records.append(_WAL_QUEUE.get_nowait())
+        except queue.Empty:
+            pass
+        payload = [record for record in records if record is not _COMPACT]
+        try:
+            if payload:
+                buf = b"".join(_dumps(record) + b"\n" for record in payload)
+                with _wal_fd_lock:
+                    if _wal_fd is None:
+                        _wal_fd = os.open(
+                            str(BOOKING_WAL),
+                            os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC,
+                            0o644,
+                        )
+                    os.write(_wal_fd, buf)
+                    os.fsync(_wal_fd)
+        finally:
+            for _ in records:
+                _WAL_QUEUE.task_done()
+        if len(payload) != len(records):
+            # Everything drained above is already fsynced, so the
+            # compaction can skip waiting on the queue
+            _flush(wait=False)
+
+
+def _drop_wal():
+    """Close the append fd and remove the log (called after compaction)."""
+    global _wal_fd
+    with _wal_fd_lock:
+        if _wal_fd is not None:
+            os.close(_wal_fd)
+            _wal_fd = None
+        BOOKING_WAL.unlink(missing_ok=True)
+
+
+_wal_thread = threading.Thread(target=_wal_writer, daemon=True)
+_wal_thread.start()
+
 
+def _append_wal(record):
+    """Queue one mutation for the write-ahead log - O(1), non-blocking."""
+    _WAL_QUEUE.put(record)
 
-def _save_bookings(data):
-    BOOKING_STORE.write_text(json.dumps(data, indent=2))
 
+def _replay_wal(store):
+    """Fold WAL records not yet compacted into the snapshot (idempotent)."""
+    if not BOOKING_WAL.exists():
+        return
+    for line in BOOKING_WAL.read_text().splitlines():
+        if not line.strip():
+            continue
+        record = _loads(line)
+        if record["op"] == "book":
+            store["bookings"][record["conf"]] = Booking(**record["booking"])
+        elif record["op"] == "cancel":
+            store["bookings"].pop(record["conf"], None)
+        elif record["op"] == "reschedule":
+            booking = store["bookings"].get(record["conf"])
+            if booking is not None:
+                booking.date = record["date"]
+                booking.time = record["time"]
 
+
+_BOOKING_FIELDS = ("date", "time", "doctor", "patient", "reason")
+
+if _USE_SQLITE:
+    import sqlite3
+
+    _conn = sqlite3.connect(str(BOOKING_DB), check_same_thread=False, isolation_level=None)
+    _conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL syncs the WAL at checkpoint rather than per commit; with
+    # journal_mode=WAL that trades at most one checkpoint of bookings on
+    # power loss for one fewer fsync per mutation
+    _conn.execute("PRAGMA synchronous=NORMAL")
+    _conn.execute(
+        "CREATE TABLE IF NOT EXISTS bookings ("
+        "conf TEXT PRIMARY KEY, date TEXT, time TEXT, doctor TEXT, "
+        "patient TEXT, reason TEXT, UNIQUE(doctor, date, time))"
+    )
+    _db_lock = threading.Lock()
+    atexit.register(_conn.close)
+
+    def _sqlite_apply(record):
+        """Mirror one mutation into SQLite; False if the engine rejects it."""
+        with _db_lock:
+            try:
+                if record["op"] == "book":
+                    booking = record["booking"]
+                    _conn.execute(
+                        "INSERT INTO bookings VALUES (?, ?, ?, ?, ?, ?)",
+                        (record["conf"],) + tuple(booking[f] for f in _BOOKING_FIELDS),
+                    )
+                elif record["op"] == "cancel":
+                    _conn.execute("DELETE FROM bookings WHERE conf = ?", (record["conf"],))
+                elif record["op"] == "reschedule":
+                    _conn.execute(
+                        "UPDATE bookings SET date = ?, time = ? WHERE conf = ?",
+                        (record["date"], record["time"], record["conf"]),
+                    )
+            except sqlite3.IntegrityError:
+                # Slot row held by another process - the UNIQUE constraint
+                # is the last line of defense against double booking
+                return False
+        return True
+
+    def _load_sqlite():
+        rows = _conn.execute("SELECT conf, date, time, doctor, patient, reason FROM bookings")
+        return {"bookings": {row[0]: Booking(*row[1:]) for row in rows}}
+
+
+def _record_mutation(record):
+    """Persist one mutation via the active backend; False if rejected."""
+    if _USE_SQLITE:
+        return _sqlite_apply(record)
+    _append_wal(record)
+    _schedule_flush()
+    return True
+
+
+# Loaded once at import; tools mutate the dict in place, durability comes
+# from the per-mutation backend write (WAL append or SQLite statement),
+# and for the JSON backend the debounce timer compacts the snapshot off
+# the hot path.
+if _USE_SQLITE:
+    _STORE = _load_sqlite()
+else:
+    _STORE = _load_bookings()
+    # Rehydrate snapshot dicts into slotted rows before WAL replay
+    _STORE["bookings"] = {
+        _conf: Booking(**_row) for _conf, _row in _STORE.get("bookings", {}).items()
+    }
+    _replay_wal(_STORE)
+
+# "slots" maps "doctor|date|time" -> confirmation and is the authority on
+# who holds a slot; claims go through dict.setdefault, which is atomic
+# under the GIL, so no lock is needed. "masks" is a derived read cache
+# for availability checks. Both are rebuilt from the snapshot + WAL here
+# so they can never disagree with the persisted bookings.
+_STORE["slots"] = {}
+_STORE["masks"] = {}
+for _conf, _booking in _STORE["bookings"].items():
+    _key = f"{_normalize_doctor(_booking.doctor)}|{_booking.date}"
+    _STORE["slots"][f"{_key}|{_booking.time}"] = _conf
+    _STORE["masks"][_key] = _STORE["masks"].get(_key, 0) | SLOT_BITS.get(_booking.time, 0)
+_dirty = False
+_flush_timer = None
+_wal_appends = 0
+
+# Flush state is touched from tool threads, the debounce timer thread and
+# the WAL writer thread; one lock keeps the dirty/timer/counter trio
+# consistent and makes concurrent _flush() calls collapse into one write
+_flush_lock = threading.Lock()
+
+# Compact unconditionally once this many mutations pile up, so a steady
+# stream of bookings (which keeps resetting the debounce timer) can't
+# grow the WAL - and the replay cost after a crash - without bound
+COMPACT_EVERY = 256
+
+
+def _flush(wait=True):
+    """Compact: write a fresh snapshot atomically, then drop the WAL.
+
+    `wait=False` is for the WAL writer thread, which has already fsynced
+    everything it drained and must not join the queue it consumes.
+    """
+    global _dirty, _flush_timer, _wal_appends
+    with _flush_lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if not _dirty:
+            return
+        _dirty = False
+        _wal_appends = 0
+    if wait:
+        # Let in-flight WAL appends land before the snapshot supersedes them
+        _WAL_QUEUE.join()
+    # dict() copies the table in one C-level step - atomic under the GIL -
+    # so tool threads booking concurrently can't resize it mid-iteration
+    rows = dict(_STORE["bookings"])
+    fd, tmp_path = tempfile.mkstemp(dir=BOOKING_STORE.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_dumps({"bookings": {conf: asdict(b) for conf, b in rows.items()}}))
+        os.replace(tmp_path, BOOKING_STORE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    # Safe to drop now; replay is idempotent if we crash before this point
+    _drop_wal()
+
+
+def _schedule_flush():
+    """Mark the store dirty and (re)start the compaction timer.
+
+    Bursts of mutations coalesce into a single snapshot rewrite; atexit
+    compacts anything still pending at shutdown, and every COMPACT_EVERY
+    appends a compaction request rides the WAL queue so the writer thread
+    rewrites the snapshot off the tool-calling path.
+    """
+    global _dirty, _flush_timer, _wal_appends
+    with _flush_lock:
+        _dirty = True
+        _wal_appends += 1
+        compact = _wal_appends >= COMPACT_EVERY
+        if compact:
+            _wal_appends = 0
+        else:
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+            _flush_timer = threading.Timer(FLUSH_DELAY_SECONDS, _flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if compact:
+        _WAL_QUEUE.put(_COMPACT)
+
+
+atexit.register(_flush)
+
+
+# Precompiled validators: one C-level fullmatch per call, and since both
+# functions are pure the results memoize per session. UAE mobile numbers
+# are exactly +971 plus nine digits - no looser shapes slip through.
+_EID_RE = re.compile(r"\d{5}")
+_PHONE_RE = re.compile(r"\+971\d{9}")
+
+
+@lru_cache(maxsize=1024)
 def validate_emirates_id(
     last_5_digits: Annotated[str, Field(description="Last 5 digits of Emirates ID")]
 ) -> str:
     """Validate Emirates ID (Mock - will use MCP Server)"""
-    if len(last_5_digits) == 5 and last_5_digits.isdigit():
+    if _EID_RE.fullmatch(last_5_digits):
         return f"✓ Emirates ID verified (ending in {last_5_digits})"
     return "✗ Invalid format. Provide 5 digits"
 
 
+@lru_cache(maxsize=1024)
 def verify_phone(
     phone: Annotated[str, Field(description="UAE phone number with country code")]
 ) -> str:
     """Verify phone number (Mock - will use MCP Server)"""
-    if phone.startswith("+971"):
+    if _PHONE_RE.fullmatch(phone):
         return f"✓ Phone {phone} verified"
     return "✗ Invalid UAE number. Format: +971XXXXXXXXX"
 
@@ -46,9 +430,45 @@ def check_availability(
     doctor: Annotated[str, Field(description="Doctor name")]
 ) -> str:
     """Check available appointment slots (Mock - will use Booking API MCP Server)"""
-    # Mock available slots
-    slots = ["09:00", "14:00", "16:30"]
-    return f"Available slots for {doctor} on {date}:\n• " + "\n• ".join(slots)
+    doctor_key = _normalize_doctor(doctor)
+    free = ~_STORE["masks"].get(_slot_key(doctor_key, date), 0) & ALL_MASK
+    return _avail_string(doctor_key, date, free)
+
+
+@lru_cache(maxsize=1024)
+def _avail_string(doctor_key, date, free_mask):
+    """Render the availability response for a free-bit mask.
+
+    The mask is part of the cache key, so entries never go stale - a
+    booking changes the mask and therefore the key.
+    """
+    if not free_mask:
+        return f"✗ No slots left for {_doctor_label(doctor_key)} on {date}"
+
+    slots = []
+    while free_mask:
+        bit = free_mask & -free_mask
+        slots.append(_SLOT_LABELS[bit])
+        free_mask ^= bit
+    return f"Available slots for {_doctor_label(doctor_key)} on {date}:\n• " + "\n• ".join(slots)
+
+
+def check_availability_batch(
+    dates: Annotated[list[str], Field(description="Dates YYYY-MM-DD")],
+    doctors: Annotated[list[str], Field(description="Doctor names")]
+) -> str:
+    """Check free slots for several dates and doctors in one query (Mock - will use Booking API MCP Server)"""
+    masks = _STORE["masks"]
+    reports = []
+    for doctor in doctors:
+        doctor_key = _normalize_doctor(doctor)
+        for date in dates:
+            free = ~masks.get(_slot_key(doctor_key, date), 0) & ALL_MASK
+            if free:
+                reports.append(_avail_string(doctor_key, date, free))
+    if not reports:
+        return "✗ No free slots for the requested doctors and dates"
+    return "\n\n".join(reports)
 
 
 def book_appointment(
@@ -59,18 +479,30 @@ def book_appointment(
     reason: Annotated[str, Field(description="Reason for visit")]
 ) -> str:
     """Book appointment (Mock - will use Booking API MCP Server)"""
-    data = _load_bookings()
-    confirmation = f"APT-{uuid4().hex[:8].upper()}"
-    
-    data["bookings"][confirmation] = {
-        "date": date,
-        "time": time,
-        "doctor": doctor,
-        "patient": patient_name,
-        "reason": reason
-    }
-    _save_bookings(data)
-    
+    slot_date, slot_time = _parse_slot_id(time)
+    bit = SLOT_BITS.get(slot_time)
+    if bit is None:
+        return "✗ Invalid time. Available slots: " + ", ".join(DEFAULT_TIME_SLOTS)
+    time = slot_time
+    date = slot_date or date
+    if not _DATE_RE.match(date):
+        return "✗ Invalid date. Format: YYYY-MM-DD"
+
+    key = _slot_key(_normalize_doctor(doctor), date)
+    confirmation = _make_confirmation()
+    # Atomic compare-and-swap: setdefault claims the slot in one bytecode
+    if _STORE["slots"].setdefault(f"{key}|{time}", confirmation) != confirmation:
+        return f"✗ {time} with {_doctor_label(doctor)} on {date} is already booked"
+
+    _STORE["masks"][key] = _STORE["masks"].get(key, 0) | bit
+    booking = Booking(date=date, time=time, doctor=doctor, patient=patient_name, reason=reason)
+    _STORE["bookings"][confirmation] = booking
+    if not _record_mutation({"op": "book", "conf": confirmation, "booking": asdict(booking)}):
+        # Engine rejected the row (slot held elsewhere) - undo the claim
+        _STORE["bookings"].pop(confirmation, None)
+        _release_slot(booking)
+        return f"✗ {time} with {_doctor_label(doctor)} on {date} is already booked"
+
     return f"✓ Appointment booked!\nConfirmation: {confirmation}\n{doctor} on {date} at {time}"
 
 
@@ -78,12 +510,13 @@ def cancel_appointment(
     confirmation_code: Annotated[str, Field(description="Appointment confirmation code")]
 ) -> str:
     """Cancel appointment (Mock - will use Booking API MCP Server)"""
-    data = _load_bookings()
-    if confirmation_code in data["bookings"]:
-        del data["bookings"][confirmation_code]
-        _save_bookings(data)
-        return f"✓ Appointment {confirmation_code} cancelled"
-    return "✗ Appointment not found"
+    # A typo'd confirmation code costs one dict lookup - no I/O at all
+    booking = _STORE["bookings"].pop(confirmation_code, None)
+    if booking is None:
+        return "✗ Appointment not found"
+    _release_slot(booking)
+    _record_mutation({"op": "cancel", "conf": confirmation_code})
+    return f"✓ Appointment {confirmation_code} cancelled"
 
 
 def reschedule_appointment(
@@ -92,10 +525,39 @@ def reschedule_appointment(
     new_time: Annotated[str, Field(description="New time HH:MM")]
 ) -> str:
     """Reschedule appointment (Mock - will use Booking API MCP Server)"""
-    data = _load_bookings()
-    if confirmation_code in data["bookings"]:
-        data["bookings"][confirmation_code]["date"] = new_date
-        data["bookings"][confirmation_code]["time"] = new_time
-        _save_bookings(data)
-        return f"✓ Appointment {confirmation_code} rescheduled to {new_date} at {new_time}"
-    return "✗ Appointment not found"
+    booking = _STORE["bookings"].get(confirmation_code)
+    if booking is None:
+        return "✗ Appointment not found"
+
+    slot_date, slot_time = _parse_slot_id(new_time)
+    new_bit = SLOT_BITS.get(slot_time)
+    if new_bit is None:
+        return "✗ Invalid time. Available slots: " + ", ".join(DEFAULT_TIME_SLOTS)
+    new_time = slot_time
+    new_date = slot_date or new_date
+    if not _DATE_RE.match(new_date):
+        return "✗ Invalid date. Format: YYYY-MM-DD"
+
+    old_date, old_time = booking.date, booking.time
+    old_key = _slot_key(_normalize_doctor(booking.doctor), old_date)
+    new_key = _slot_key(_normalize_doctor(booking.doctor), new_date)
+    moved = f"{new_key}|{new_time}" != f"{old_key}|{old_time}"
+    if moved:
+        # Claim the new slot first (CAS), then release the old one
+        if _STORE["slots"].setdefault(f"{new_key}|{new_time}", confirmation_code) != confirmation_code:
+            return f"✗ {new_time} on {new_date} is already booked"
+        _release_slot(booking)
+        _STORE["masks"][new_key] = _STORE["masks"].get(new_key, 0) | new_bit
+    booking.date = new_date
+    booking.time = new_time
+    if not _record_mutation({"op": "reschedule", "conf": confirmation_code, "date": new_date, "time": new_time}):
+        # Engine rejected the move (slot held elsewhere) - release the new
+        # claim, re-claim the old slot and put the booking back
+        if moved:
+            _release_slot(booking)
+            _STORE["slots"][f"{old_key}|{old_time}"] = confirmation_code
+            _STORE["masks"][old_key] = _STORE["masks"].get(old_key, 0) | SLOT_BITS.get(old_time, 0)
+        booking.date = old_date
+        booking.time = old_time
+        return f"✗ {new_time} on {new_date} is already booked"
+    return f"✓ Appointment {confirmation_code} rescheduled to {new_date} at {new_time}"
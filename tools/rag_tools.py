@@ -3,43 +3,209 @@ RAG Tools - Mocked clinic information retrieval
 TODO: Replace with Azure AI Search or MCP Server
 """
 
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Annotated
 from pydantic import Field
 
 
-# Mock clinic database
-CLINIC_INFO = """
+@dataclass(slots=True, frozen=True)
+class Doctor:
+    """Read-only doctor record with search fields pre-lowercased and the
+    display card pre-rendered, so lookups never case-fold or format."""
+    name: str
+    specialty: str
+    languages: tuple
+    specialty_l: str
+    languages_l: frozenset
+    card: str
+
+
+def _doctor(name, specialty, *languages):
+    return Doctor(
+        name=name,
+        specialty=specialty,
+        languages=languages,
+        specialty_l=specialty.lower(),
+        languages_l=frozenset(lang.lower() for lang in languages),
+        card=f"• {name} - {specialty} ({', '.join(languages)})",
+    )
+
+
+_DOCTORS = (
+    _doctor("Dr. Khalid Al Blooshi", "Cardiology", "English", "Arabic"),
+    _doctor("Dr. Sarah Williams", "Pediatrics", "English", "French"),
+    _doctor("Dr. Mohammed Ahmed", "Internal Medicine", "English", "Arabic", "Urdu"),
+)
+
+# Mock clinic database - read-only, so nested containers are immutable
+# (tuples + MappingProxyType) and membership sets can be precomputed
+CLINIC_INFO_DB = MappingProxyType({
+    "location": "Al Maryah Island, Abu Dhabi, UAE",
+    "hours": MappingProxyType({
+        "Sunday - Thursday": "8:00 AM - 8:00 PM",
+        "Friday": "8:00 AM - 6:00 PM",
+        "Saturday": "8:00 AM - 4:00 PM",
+    }),
+    "doctors": _DOCTORS,
+    "services": ("Cardiology", "Pediatrics", "Internal Medicine", "Emergency (24/7)", "Laboratory", "Imaging"),
+    "insurance": ("ADNIC", "Daman", "AXA Gulf", "Oman Insurance", "MetLife Alico", "Neuron", "Nextcare", "Cigna"),
+    "contact": "+971 2 501 9999",
+})
+
+# O(1) exact membership plus (lowercase, original) pairs for substring hits
+_INSURANCE_BY_LOWER = {ins.lower(): ins for ins in CLINIC_INFO_DB["insurance"]}
+_INSURANCE_SET = frozenset(_INSURANCE_BY_LOWER)
+
+# Sections are rendered once at import - the DB is effectively immutable
+_LOCATION_SECTION = f"📍 Location: {CLINIC_INFO_DB['location']}"
+_HOURS_SECTION = "⏰ Hours:\n" + "\n".join(
+    f"• {days}: {hours}" for days, hours in CLINIC_INFO_DB["hours"].items()
+)
+_DOCTOR_CARDS = tuple(doc.card for doc in _DOCTORS)
+_DOCTORS_SECTION = "👨‍⚕️ Doctors:\n" + "\n".join(_DOCTOR_CARDS)
+
+# Inverted indexes for search_doctors: specialty/language -> doctor indices
+_ALL_DOCTOR_IDXS = frozenset(range(len(_DOCTORS)))
+_SPECIALTY_IDX = {}
+_LANG_IDX = {}
+for _i, _doc in enumerate(_DOCTORS):
+    _SPECIALTY_IDX.setdefault(_doc.specialty_l, set()).add(_i)
+    for _lang in _doc.languages_l:
+        _LANG_IDX.setdefault(_lang, set()).add(_i)
+_SERVICES_SECTION = "🏥 Services:\n" + "\n".join(f"• {svc}" for svc in CLINIC_INFO_DB["services"])
+_INSURANCE_SECTION = "💳 Accepted Insurance:\n" + ", ".join(CLINIC_INFO_DB["insurance"])
+_CONTACT_SECTION = f"📞 Contact: {CLINIC_INFO_DB['contact']}"
+
+CLINIC_INFO = f"""
 **Abu Dhabi Clinic**
 
-📍 Location: Al Maryah Island, Abu Dhabi, UAE
+{_LOCATION_SECTION}
 
-⏰ Hours:
-• Sunday - Thursday: 8:00 AM - 8:00 PM
-• Friday: 8:00 AM - 6:00 PM
-• Saturday: 8:00 AM - 4:00 PM
+{_HOURS_SECTION}
 
-👨‍⚕️ Doctors:
-• Dr. Khalid Al Blooshi - Cardiology (English, Arabic)
-• Dr. Sarah Williams - Pediatrics (English, French)
-• Dr. Mohammed Ahmed - Internal Medicine (English, Arabic, Urdu)
+{_DOCTORS_SECTION}
 
-🏥 Services:
-• Cardiology
-• Pediatrics
-• Internal Medicine
-• Emergency (24/7)
-• Laboratory
-• Imaging
+{_SERVICES_SECTION}
 
-💳 Accepted Insurance:
-ADNIC, Daman, AXA Gulf, Oman Insurance, MetLife Alico, Neuron, Nextcare, Cigna
+{_INSURANCE_SECTION}
 
-📞 Contact: +971 2 501 9999
+{_CONTACT_SECTION}
 """
 
 
+# Pre-encoded once for callers that ship the blob over the wire, so the
+# response layer never re-runs .encode on a string that can't change
+_CLINIC_INFO_BYTES = CLINIC_INFO.encode("utf-8")
+
+
+def _norm(s):
+    """Normalize a query arg for cache keys"""
+    return s.lower().strip() if s else ""
+
+
+# Keyword -> section routing for get_clinic_info: topical questions get
+# just the sections they asked about instead of the whole blob, which
+# cuts the tokens the LLM re-reads per tool result several-fold
+_SECTIONS = {
+    "hours": _HOURS_SECTION,
+    "doctors": _DOCTORS_SECTION,
+    "insurance": _INSURANCE_SECTION,
+    "services": _SERVICES_SECTION,
+    "location": _LOCATION_SECTION,
+    "contact": _CONTACT_SECTION,
+}
+_KEYWORDS = (
+    ("hour", "hours"), ("open", "hours"), ("close", "hours"),
+    ("doctor", "doctors"), ("physician", "doctors"), ("specialist", "doctors"),
+    ("insurance", "insurance"), ("accept", "insurance"), ("cover", "insurance"),
+    ("service", "services"), ("offer", "services"), ("treat", "services"),
+    ("location", "location"), ("address", "location"), ("where", "location"),
+    ("contact", "contact"), ("phone", "contact"), ("call", "contact"),
+)
+
+
+@lru_cache(maxsize=256)
+def _clinic_info(query):
+    # dict.fromkeys dedupes while keeping section order stable
+    matched = dict.fromkeys(section for kw, section in _KEYWORDS if kw in query)
+    if not matched:
+        return CLINIC_INFO
+    return "\n\n".join(_SECTIONS[section] for section in matched)
+
+
 def get_clinic_info(
     query: Annotated[str, Field(description="What information the user is asking about")]
 ) -> str:
     """Get clinic information - hours, doctors, insurance, services, location, contact"""
-    return CLINIC_INFO
+    return _clinic_info(_norm(query))
+
+
+def get_clinic_info_bytes() -> bytes:
+    """Full clinic info as UTF-8 bytes, encoded once at import"""
+    return _CLINIC_INFO_BYTES
+
+
+def get_clinic_hours() -> str:
+    """Get clinic opening hours"""
+    return _HOURS_SECTION
+
+
+def get_location_info() -> str:
+    """Get clinic location and contact details"""
+    return f"{_LOCATION_SECTION}\n{_CONTACT_SECTION}"
+
+
+def get_services_info() -> str:
+    """Get the list of services the clinic offers"""
+    return _SERVICES_SECTION
+
+
+@lru_cache(maxsize=256)
+def _insurance_info(insurance_name):
+    if not insurance_name:
+        return _INSURANCE_SECTION
+    if insurance_name in _INSURANCE_SET:
+        return f"✓ Yes, we accept {_INSURANCE_BY_LOWER[insurance_name]}"
+    for lower, original in _INSURANCE_BY_LOWER.items():
+        if insurance_name in lower:
+            return f"✓ Yes, we accept {original}"
+    return f"✗ We don't accept {insurance_name}.\n{_INSURANCE_SECTION}"
+
+
+def get_insurance_info(
+    insurance_name: Annotated[str, Field(description="Insurance provider to check, empty for the full list")] = ""
+) -> str:
+    """Check whether an insurance provider is accepted"""
+    return _insurance_info(_norm(insurance_name))
+
+
+def _index_lookup(index, term):
+    """Doctor indices for a search term: exact hit, else substring match"""
+    if not term:
+        return _ALL_DOCTOR_IDXS
+    hit = index.get(term)
+    if hit is not None:
+        return hit
+    matched = set()
+    for key, idxs in index.items():
+        if term in key:
+            matched |= idxs
+    return matched
+
+
+@lru_cache(maxsize=256)
+def _search_doctors(specialty, language):
+    idxs = _index_lookup(_SPECIALTY_IDX, specialty) & _index_lookup(_LANG_IDX, language)
+    if not idxs:
+        return "✗ No doctors match that search.\n" + _DOCTORS_SECTION
+    return "👨‍⚕️ Matching doctors:\n" + "\n".join(_DOCTOR_CARDS[i] for i in sorted(idxs))
+
+
+def search_doctors(
+    specialty: Annotated[str, Field(description="Specialty to filter by, e.g. Cardiology")] = "",
+    language: Annotated[str, Field(description="Language the doctor should speak")] = ""
+) -> str:
+    """Find doctors by specialty and/or spoken language"""
+    return _search_doctors(_norm(specialty), _norm(language))